@@ -1,11 +1,31 @@
 import os
+import re
+import sys
+import io
+import json
 import html
-from datetime import datetime
+import time
+import numbers
+import warnings
+import atexit
+import asyncio
+import sqlite3
+import hashlib
+import argparse
+import functools
+import threading
+import unicodedata
+from concurrent.futures import ThreadPoolExecutor
+import httpx
+import numpy as np
+import faiss
 import pandas as pd
 from dateutil import parser as dateparser
-import validators
 from dotenv import load_dotenv
-from openai import OpenAI
+from openai import (
+    OpenAI, AsyncOpenAI, APIConnectionError, APITimeoutError, InternalServerError, RateLimitError,
+)
+from tenacity import retry, retry_if_exception_type, stop_after_attempt, wait_exponential
 from flask import Flask, render_template, request
 
 # --- Flask app ---
@@ -14,7 +34,38 @@ app = Flask(__name__)
 # --- Chargement des variables d'environnement ---
 load_dotenv()
 client = OpenAI(api_key=os.environ.get("OPENAI_API_KEY"))
+# Pool de connexions partagé par toutes les coroutines : assez de connexions
+# keep-alive pour les appels concurrents, sans refaire la poignée de main TCP/TLS
+http_client = httpx.AsyncClient(
+    limits=httpx.Limits(max_connections=200, max_keepalive_connections=100, keepalive_expiry=30),
+    timeout=httpx.Timeout(60.0, connect=5.0),
+    http2=True,
+)
+# max_retries=0 : les reprises sont gérées par tenacity (retry_transient) uniquement
+async_client = AsyncOpenAI(api_key=os.environ.get("OPENAI_API_KEY"), http_client=http_client, max_retries=0)
 OPENAI_MODEL = os.getenv("OPENAI_MODEL", "gpt-4o-mini")
+OPENAI_CONCURRENCY = int(os.getenv("OPENAI_CONCURRENCY", "10"))
+SUMMARY_CHUNK = int(os.getenv("SUMMARY_CHUNK", "15"))
+BATCH_POLL_SECONDS = int(os.getenv("BATCH_POLL_SECONDS", "30"))
+EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "text-embedding-3-small")
+SUMMARY_CACHE_PATH = os.getenv("SUMMARY_CACHE_PATH", "summary_cache.sqlite3")
+SEMANTIC_CACHE_THRESHOLD = float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.93"))
+
+# --- Boucle asyncio dédiée aux appels OpenAI ---
+# Une seule boucle pour toute la durée du process : le client async garde
+# ses connexions liées à cette boucle d'une requête Flask à l'autre.
+_loop = asyncio.new_event_loop()
+threading.Thread(target=_loop.run_forever, daemon=True).start()
+
+def run_async(coro):
+    return asyncio.run_coroutine_threadsafe(coro, _loop).result()
+
+@atexit.register
+def _close_http_client():
+    try:
+        run_async(http_client.aclose())
+    except Exception:
+        pass
 
 # --- Colonnes attendues ---
 REQUIRED_COLS = {
@@ -24,6 +75,7 @@ REQUIRED_COLS = {
 }
 CONTENT_CANDIDATES = ["snippet", "content", "texte", "text", "body", "résumé", "summary"]
 TITLE_CANDIDATES = ["article", "titre", "title", "intitulé", "headline"]
+URL_RE = re.compile(r"^https?://[^\s/$.?#].[^\s]*$", re.I)
 
 # --- Fonctions utilitaires ---
 def coerce_date(x):
@@ -34,25 +86,78 @@ def coerce_date(x):
     except Exception:
         return None
 
-def find_col(df, candidates):
+def _naive(ts):
+    # On garde l'heure locale et on retire le fuseau, comme le strftime de dateutil le faisait
+    return ts.replace(tzinfo=None) if getattr(ts, "tzinfo", None) else ts
+
+def _as_naive(parsed):
+    # Décalages différents (changement d'heure) ou mélange naïf/aware : pandas rend
+    # une Series object, sur laquelle .dt n'est pas disponible
+    if isinstance(parsed.dtype, pd.DatetimeTZDtype):
+        return parsed.dt.tz_localize(None)
+    if parsed.dtype == object:
+        return pd.to_datetime(parsed.map(_naive), errors="coerce")
+    return parsed
+
+def parse_dates(values):
+    # Une passe vectorisée (C) sur la colonne ; dateutil seulement pour les cellules restées NaT.
+    # Les nombres (numéros de série Excel) ne sont pas pris pour des timestamps epoch :
+    # ils restent NaT et la valeur brute est reprise telle quelle.
+    numeric = values.map(lambda x: isinstance(x, numbers.Real))
+    candidates = values.mask(numeric)
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", (FutureWarning, UserWarning))
+        parsed = _as_naive(pd.to_datetime(candidates, dayfirst=True, errors="coerce"))
+    missing = parsed.isna() & candidates.notna()
+    if missing.any():
+        fallback = candidates[missing].map(lambda x: _naive(coerce_date(x)))
+        parsed = parsed.fillna(pd.to_datetime(fallback, errors="coerce"))
+    return parsed
+
+@functools.lru_cache(maxsize=1024)
+def normalize_colname(name):
+    # Insensible à la casse, aux espaces et aux accents ("Intitulé" == "intitule")
+    decomposed = unicodedata.normalize("NFD", str(name).strip().lower())
+    return "".join(c for c in decomposed if not unicodedata.combining(c))
+
+def normalized_columns(df):
+    normalized_map = {}
+    for col in df.columns:
+        normalized_map.setdefault(normalize_colname(col), col)
+    return normalized_map
+
+def find_col(normalized_map, candidates):
     for cand in candidates:
-        for col in df.columns:
-            if col.strip().lower() == cand.strip().lower():
-                return col
+        col = normalized_map.get(normalize_colname(cand))
+        if col is not None:
+            return col
     return None
 
+def read_excel(source):
+    # calamine (Rust) relâche le GIL : les lectures en parallèle passent réellement à l'échelle
+    return pd.read_excel(source, engine="calamine")
+
+def load_excels(paths):
+    with ThreadPoolExecutor(max_workers=min(len(paths), os.cpu_count() or 1)) as pool:
+        return list(pool.map(read_excel, paths))
+
+def _format_lines(lines, limit=10):
+    shown = ", ".join(str(n) for n in lines[:limit])
+    return shown + ("…" if len(lines) > limit else "")
+
 def validate_dataframe(df):
     issues = []
     col_map = {}
+    normalized_map = normalized_columns(df)
     for logical, names in REQUIRED_COLS.items():
-        col = find_col(df, names)
+        col = find_col(normalized_map, names)
         if not col:
             issues.append(f"Colonne requise manquante : {logical} (attendu parmi {names})")
         else:
             col_map[logical] = col
 
-    content_col = find_col(df, CONTENT_CANDIDATES)
-    title_col = find_col(df, TITLE_CANDIDATES)
+    content_col = find_col(normalized_map, CONTENT_CANDIDATES)
+    title_col = find_col(normalized_map, TITLE_CANDIDATES)
 
     if not content_col:
         issues.append("⚠️ Pas de colonne de contenu trouvée (résumés plus pauvres).")
@@ -66,33 +171,476 @@ def validate_dataframe(df):
     date_col = col_map["published"]
     url_col = col_map["URL"]
 
-    parsed_dates = df[date_col].apply(coerce_date)
-    df = df.copy()
-    df["_parsed_date"] = parsed_dates
+    # Numéros de ligne Excel : +2 pour l'en-tête et l'indexation à partir de 1
+    urls = df[url_col].fillna("").astype(str).str.strip()
+    invalid_urls = (np.flatnonzero(urls.ne("") & ~urls.str.match(URL_RE)) + 2).tolist()
+    if invalid_urls:
+        issues.append(f"⚠️ {len(invalid_urls)} URL(s) invalide(s) (lignes {_format_lines(invalid_urls)}).")
+
+    pub_empty = df[pub_col].fillna("").astype(str).str.strip().eq("")
+    if pub_empty.any():
+        empty_lines = (np.flatnonzero(pub_empty) + 2).tolist()
+        issues.append(f"⚠️ {int(pub_empty.sum())} ligne(s) sans publication (lignes {_format_lines(empty_lines)}).")
+
+    # Ajout en place (pas de copie) : df sort tout juste de read_excel et l'appelant
+    # réutilise _parsed_date dans extract_articles
+    df["_parsed_date"] = parse_dates(df[date_col])
 
     return issues, col_map, content_col, title_col
 
-def smart_summarize(publication, date_str, title, content, url, max_words=60):
-    base_context = content or title or publication or url or "Article de presse"
-    prompt = (
-        f"Résume cet article de presse en français, de manière claire et concise (max ~{max_words} mots).\n\n"
-        f"CONTEXTE:\n{base_context}\n\n"
-        "Attendu: un seul paragraphe, neutre et informatif."
+def build_context(publication, title, content, url):
+    return content or title or publication or url or "Article de presse"
+
+def local_summary(publication, title, content, max_words=60):
+    # Pas d'appel OpenAI quand le contenu est déjà un court chapô, ou quand il n'y a rien à résumer
+    if content and len(content.split()) <= max_words:
+        return content
+    if not content and not title:
+        return publication or None
+    return None
+
+# --- Consignes de résumé ---
+# Consignes fixes en tête de requête (rôle system), articles à la fin. Le bloc reste
+# volontairement sous les 1024 tokens du cache de préfixes d'OpenAI : le gonfler
+# coûterait plus que la remise. Aucun hit de ce cache n'est donc attendu (après ces
+# ~150 tokens, le JSON des articles diffère d'un lot à l'autre).
+_STYLE_RULES = (
+    "Tu es un assistant de veille média qui rédige des revues de presse en français.\n"
+    "Règles :\n"
+    "- Un seul paragraphe par article, au maximum ~{max_words} mots.\n"
+    "- Ton neutre et informatif, sans opinion ni jugement.\n"
+    "- Conserve les faits essentiels : qui, quoi, où, quand, chiffres clés.\n"
+    "- N'invente rien qui ne figure pas dans le contexte fourni.\n"
+    "- Rédige en français même si l'article est dans une autre langue.\n"
+)
+# À incrémenter à chaque changement des consignes : invalide le cache des résumés
+PROMPT_VERSION = 2
+SUMMARY_INSTRUCTIONS = _STYLE_RULES + "Réponds uniquement par le résumé, sans titre ni préambule."
+BATCH_SUMMARY_INSTRUCTIONS = _STYLE_RULES + (
+    "Tu reçois une liste JSON d'articles [{{\"id\": ..., \"contexte\": ...}}].\n"
+    "Résume chacun d'eux et réponds STRICTEMENT en JSON : "
+    "{{\"resumes\": [{{\"id\": 0, \"resume\": \"...\"}}, ...]}}"
+)
+
+def build_prompt(publication, title, content, url, max_words=60):
+    base_context = build_context(publication, title, content, url)
+    return [
+        {"role": "system", "content": SUMMARY_INSTRUCTIONS.format(max_words=max_words)},
+        {"role": "user", "content": f"---ARTICLE---\n{base_context}"},
+    ]
+
+def build_batch_prompt(articles, max_words=60):
+    payload = json.dumps(
+        [{"id": i, "contexte": build_context(a["publication"], a["title"], a["content"], a["url"])}
+         for i, a in enumerate(articles)],
+        ensure_ascii=False,
+    )
+    return [
+        {"role": "system", "content": BATCH_SUMMARY_INSTRUCTIONS.format(max_words=max_words)},
+        {"role": "user", "content": f"---ARTICLES---\n{payload}"},
+    ]
+
+# --- Cache des résumés (exact + sémantique) ---
+# Les dépêches reprises par plusieurs médias donnent des contextes identiques
+# ou quasi identiques : on réutilise le résumé déjà payé.
+class SummaryCache:
+    def __init__(self, path):
+        # Un index par modèle d'embedding : des vecteurs de dimensions différentes
+        # ne peuvent pas cohabiter dans le même index FAISS
+        embedding_tag = re.sub(r"[^A-Za-z0-9._-]", "_", EMBEDDING_MODEL)
+        self.index_path = f"{os.path.splitext(path)[0]}.{embedding_tag}.faiss"
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        columns = [row[1] for row in self.db.execute("PRAGMA table_info(cache)")]
+        if columns and "variant" not in columns:
+            # Ancien schéma : clés sans modèle ni consignes, entrées inutilisables
+            self.db.execute("DROP TABLE cache")
+            columns = []
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS cache (id INTEGER PRIMARY KEY, key TEXT UNIQUE, variant TEXT NOT NULL, "
+            "embedding BLOB, embedding_model TEXT, summary TEXT NOT NULL)"
+        )
+        if columns and "embedding_model" not in columns:
+            # Vecteurs d'origine inconnue : gardés pour le cache exact, exclus du cache sémantique
+            self.db.execute("ALTER TABLE cache ADD COLUMN embedding_model TEXT")
+        self.db.commit()
+        self.index = self._load_index()
+        self.dirty = False
+
+    @staticmethod
+    def variant_for(max_words):
+        # Un résumé ne vaut que pour le modèle, la longueur et les consignes qui l'ont produit
+        return f"{OPENAI_MODEL}|{max_words}|v{PROMPT_VERSION}"
+
+    @staticmethod
+    def key_for(context, variant):
+        return hashlib.sha256(f"{variant}\n{context.strip().lower()}".encode("utf-8")).hexdigest()
+
+    def _load_index(self):
+        rows = self.db.execute(
+            "SELECT id, embedding FROM cache WHERE embedding IS NOT NULL AND embedding_model = ? ORDER BY id",
+            (EMBEDDING_MODEL,),
+        ).fetchall()
+        # Dimension des vecteurs les plus récents ; les autres sont ignorés
+        dim = len(rows[-1][1]) // 4 if rows else None
+        rows = [(i, emb) for i, emb in rows if len(emb) // 4 == dim]
+        if os.path.exists(self.index_path):
+            try:
+                index = faiss.read_index(self.index_path)
+                if index.ntotal == len(rows) and index.d == dim:
+                    return index
+            except Exception:
+                pass  # fichier tronqué ou illisible : reconstruit ci-dessous
+        # Index absent, illisible ou désynchronisé : on le reconstruit depuis sqlite
+        if not rows:
+            return None
+        vecs = np.vstack([np.frombuffer(emb, dtype="float32") for _, emb in rows])
+        index = faiss.IndexIDMap(faiss.IndexFlatIP(dim))
+        index.add_with_ids(vecs, np.array([i for i, _ in rows], dtype="int64"))
+        return index
+
+    def get(self, key):
+        with self.lock:
+            row = self.db.execute("SELECT summary FROM cache WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def search(self, vec, variant, k=8):
+        # Les voisins produits par un autre modèle ou d'autres consignes sont ignorés
+        with self.lock:
+            if self.index is None or self.index.ntotal == 0 or self.index.d != vec.shape[0]:
+                return None
+            scores, ids = self.index.search(vec.reshape(1, -1), min(k, self.index.ntotal))
+            for score, rowid in zip(scores[0], ids[0]):
+                if rowid == -1 or score < SEMANTIC_CACHE_THRESHOLD:
+                    break
+                row = self.db.execute(
+                    "SELECT summary FROM cache WHERE id = ? AND variant = ? AND embedding_model = ?",
+                    (int(rowid), variant, EMBEDDING_MODEL),
+                ).fetchone()
+                if row:
+                    return row[0]
+        return None
+
+    def put_many(self, entries, variant):
+        # entries : (key, embedding normalisé ou None, résumé)
+        with self.lock:
+            added_ids, added_vecs = [], []
+            for key, vec, summary in entries:
+                cur = self.db.execute(
+                    "INSERT OR IGNORE INTO cache (key, variant, embedding, embedding_model, summary) "
+                    "VALUES (?, ?, ?, ?, ?)",
+                    (key, variant, vec.tobytes() if vec is not None else None,
+                     EMBEDDING_MODEL if vec is not None else None, summary),
+                )
+                if cur.rowcount and vec is not None:
+                    added_ids.append(cur.lastrowid)
+                    added_vecs.append(vec)
+            self.db.commit()
+            if added_vecs:
+                vecs = np.vstack(added_vecs)
+                if self.index is None or self.index.d != vecs.shape[1]:
+                    self.index = faiss.IndexIDMap(faiss.IndexFlatIP(vecs.shape[1]))
+                self.index.add_with_ids(vecs, np.array(added_ids, dtype="int64"))
+                self.dirty = True
+
+    def save(self):
+        # Réécrit tout le fichier FAISS : une fois par revue, pas à chaque insertion
+        with self.lock:
+            if self.dirty:
+                # Fichier temporaire puis os.replace : un autre worker ne lit jamais un index à moitié écrit
+                tmp_path = f"{self.index_path}.{os.getpid()}.tmp"
+                faiss.write_index(self.index, tmp_path)
+                os.replace(tmp_path, self.index_path)
+                self.dirty = False
+
+summary_cache = SummaryCache(SUMMARY_CACHE_PATH)
+
+async def _embed(texts):
+    vecs = []
+    for i in range(0, len(texts), 512):
+        resp = await async_client.embeddings.create(model=EMBEDDING_MODEL, input=texts[i:i + 512])
+        vecs.extend(d.embedding for d in resp.data)
+    vecs = np.array(vecs, dtype="float32")
+    faiss.normalize_L2(vecs)
+    return vecs
+
+async def cache_lookup(contexts, max_words=60):
+    variant = SummaryCache.variant_for(max_words)
+    keys = [SummaryCache.key_for(c, variant) for c in contexts]
+    summaries = [summary_cache.get(k) for k in keys]
+    vectors = [None] * len(contexts)
+    misses = [i for i, s in enumerate(summaries) if s is None]
+    if not misses:
+        return summaries, vectors
+    try:
+        embedded = await _embed([contexts[i] for i in misses])
+    except Exception:
+        return summaries, vectors  # pas d'embedding : seul le cache exact s'applique
+    semantic_hits = []
+    for i, vec in zip(misses, embedded):
+        vectors[i] = vec
+        try:
+            summaries[i] = summary_cache.search(vec, variant)
+        except Exception:
+            continue  # index inutilisable : seul le cache exact s'applique
+        if summaries[i] is not None:
+            semantic_hits.append((keys[i], None, summaries[i]))
+    # Un hit sémantique devient un hit exact pour ce contexte la prochaine fois
+    summary_cache.put_many(semantic_hits, variant)
+    return summaries, vectors
+
+def cache_store(contexts, vectors, summaries, max_words=60):
+    variant = SummaryCache.variant_for(max_words)
+    summary_cache.put_many([
+        (SummaryCache.key_for(c, variant), v, s)
+        for c, v, s in zip(contexts, vectors, summaries)
+        if isinstance(s, str) and s
+    ], variant)
+    summary_cache.save()
+
+# Reprise avec backoff seulement pour les erreurs passagères (quota, timeout, réseau, 5xx) ;
+# une 400/401 échoue tout de suite
+retry_transient = retry(
+    retry=retry_if_exception_type((RateLimitError, APITimeoutError, APIConnectionError, InternalServerError)),
+    wait=wait_exponential(min=1, max=20),
+    stop=stop_after_attempt(3),
+    reraise=True,
+)
+
+@retry_transient
+async def smart_summarize(publication, date_str, title, content, url, max_words=60):
+    local = local_summary(publication, title, content, max_words)
+    if local:
+        return local
+    resp = await async_client.responses.create(
+        model=OPENAI_MODEL, input=build_prompt(publication, title, content, url, max_words)
     )
-    resp = client.responses.create(model=OPENAI_MODEL, input=prompt)
     return resp.output_text.strip()
 
+async def _summarize_one(sem, article, max_words=60):
+    # Repli de batch_summarize, qui a déjà consulté le cache et stockera le résultat
+    async with sem:
+        return await smart_summarize(**article, max_words=max_words)
+
+@retry_transient
+async def _summarize_chunk(articles, max_words):
+    resp = await async_client.responses.create(
+        model=OPENAI_MODEL,
+        input=build_batch_prompt(articles, max_words),
+        text={"format": {"type": "json_object"}},
+    )
+    data = json.loads(resp.output_text)
+    return {
+        int(r["id"]): str(r["resume"]).strip()
+        for r in data.get("resumes", [])
+        if isinstance(r, dict) and "id" in r and r.get("resume")
+    }
+
+async def _summarize_chunk_or_each(sem, articles, max_words):
+    async with sem:
+        try:
+            by_id = await _summarize_chunk(articles, max_words)
+        except Exception as e:
+            # Lot en échec : pas de repli article par article, qui échouerait de la même façon
+            return [e] * len(articles)
+    # Articles absents d'une réponse JSON valide : on retombe sur un appel par article
+    missing = [i for i in range(len(articles)) if not by_id.get(i)]
+    retried = await asyncio.gather(
+        *(_summarize_one(sem, articles[i], max_words) for i in missing), return_exceptions=True
+    )
+    by_id.update(zip(missing, retried))
+    return [by_id[i] for i in range(len(articles))]
+
+async def batch_summarize(articles, chunk=SUMMARY_CHUNK, max_words=60):
+    contexts = [build_context(a["publication"], a["title"], a["content"], a["url"]) for a in articles]
+    summaries = [local_summary(a["publication"], a["title"], a["content"], max_words) for a in articles]
+    vectors = [None] * len(articles)
+
+    # Contextes identiques (dépêches reprises par plusieurs médias) : un seul
+    # représentant est résumé, le résultat est recopié sur toutes ses lignes
+    groups = {}
+    for i, s in enumerate(summaries):
+        if s is None:
+            groups.setdefault(contexts[i], []).append(i)
+
+    def fan_out(i, summary):
+        for k in groups[contexts[i]]:
+            summaries[k] = summary
+
+    pending = [rows[0] for rows in groups.values()]
+    cached, pending_vectors = await cache_lookup([contexts[i] for i in pending], max_words)
+    for i, summary, vec in zip(pending, cached, pending_vectors):
+        vectors[i] = vec
+        if summary is not None:
+            fan_out(i, summary)
+    todo = [i for i in pending if summaries[i] is None]
+
+    sem = asyncio.Semaphore(OPENAI_CONCURRENCY)
+
+    async def run_chunk(indices):
+        part = await _summarize_chunk_or_each(sem, [articles[j] for j in indices], max_words)
+        for j, summary in zip(indices, part):
+            fan_out(j, summary)
+
+    chunks = [todo[i:i + chunk] for i in range(0, len(todo), chunk)]
+    await asyncio.gather(*(run_chunk(c) for c in chunks))
+    cache_store([contexts[j] for j in todo], [vectors[j] for j in todo], [summaries[j] for j in todo], max_words)
+    return summaries
+
+def _response_text(body):
+    # Les lignes de sortie Batch contiennent l'objet Response brut (sans output_text)
+    texts = [
+        c.get("text", "")
+        for item in body.get("output", [])
+        if item.get("type") == "message"
+        for c in item.get("content", [])
+        if c.get("type") == "output_text"
+    ]
+    return "".join(texts).strip() or None
+
+def _batch_error(result):
+    error = result.get("error") or ((result.get("response") or {}).get("body") or {}).get("error") or {}
+    if isinstance(error, dict):
+        return error.get("message") or error.get("code")
+    return str(error) or None
+
+# API Batch : ~50% moins cher, sans limite par minute, mais résultat sous 24h max.
+# Réservé au traitement hors ligne : bloque jusqu'à la fin du batch.
+def summarize_with_batch_api(articles, max_words=60):
+    # Une seule requête par contexte distinct, recopiée ensuite sur les doublons ;
+    # les chapôs déjà courts et les lignes vides ne partent pas dans le batch
+    contexts = [build_context(a["publication"], a["title"], a["content"], a["url"]) for a in articles]
+    by_context = {}
+    first_row = {}
+    for i, (a, ctx) in enumerate(zip(articles, contexts)):
+        if ctx in by_context or ctx in first_row:
+            continue
+        local = local_summary(a["publication"], a["title"], a["content"], max_words)
+        if local is not None:
+            by_context[ctx] = local
+        else:
+            first_row[ctx] = i
+    # Cache des résumés consulté comme en ligne : seuls les contextes inconnus partent dans le batch
+    candidates = list(first_row)
+    cached, candidate_vectors = run_async(cache_lookup(candidates, max_words))
+    vectors = dict(zip(candidates, candidate_vectors))
+    unique = []
+    for ctx, summary in zip(candidates, cached):
+        if summary is not None:
+            by_context[ctx] = summary
+        else:
+            unique.append(ctx)
+    if not unique:
+        return [by_context.get(c) for c in contexts]
+
+    lines = []
+    for u, ctx in enumerate(unique):
+        a = articles[first_row[ctx]]
+        prompt = build_prompt(a["publication"], a["title"], a["content"], a["url"], max_words)
+        lines.append(json.dumps({
+            "custom_id": f"row-{u}",
+            "method": "POST",
+            "url": "/v1/responses",
+            "body": {"model": OPENAI_MODEL, "input": prompt},
+        }, ensure_ascii=False))
+    payload = "\n".join(lines).encode("utf-8")
+
+    input_file = client.files.create(file=("revue_de_presse.jsonl", payload), purpose="batch")
+    batch = client.batches.create(input_file_id=input_file.id, endpoint="/v1/responses", completion_window="24h")
+    while batch.status not in ("completed", "failed", "expired", "cancelled"):
+        time.sleep(BATCH_POLL_SECONDS)
+        batch = client.batches.retrieve(batch.id)
+    if batch.status != "completed":
+        errors = getattr(batch.errors, "data", None) or []
+        detail = f" : {errors[0].message}" if errors else ""
+        raise RuntimeError(f"Batch {batch.id} terminé avec le statut {batch.status}{detail}")
+
+    # Les requêtes en échec arrivent dans le fichier d'erreurs, ou en non-200 dans la sortie
+    succeeded, failed, first_error = 0, 0, None
+    for file_id in (batch.output_file_id, batch.error_file_id):
+        if not file_id:
+            continue
+        for line in client.files.content(file_id).text.splitlines():
+            if not line.strip():
+                continue
+            result = json.loads(line)
+            response = result.get("response") or {}
+            text = _response_text(response.get("body") or {}) if response.get("status_code") == 200 else None
+            if text is None:
+                failed += 1
+                first_error = first_error or _batch_error(result)
+                continue
+            succeeded += 1
+            u = int(result["custom_id"].removeprefix("row-"))
+            by_context[unique[u]] = text
+
+    counts = getattr(batch, "request_counts", None)
+    failed = max(failed, getattr(counts, "failed", 0) or 0)
+    if failed:
+        print(f"⚠️ {failed}/{len(unique)} requête(s) du batch en échec : {first_error or 'erreur inconnue'}", file=sys.stderr)
+    if not succeeded:
+        raise RuntimeError(f"Batch {batch.id} : aucune requête n'a abouti")
+    cache_store(unique, [vectors[c] for c in unique], [by_context.get(c) for c in unique], max_words)
+    return [by_context.get(c) for c in contexts]
+
+def extract_articles(df, col_map, content_col, title_col):
+    published = df[col_map["published"]]
+    parsed = df["_parsed_date"] if "_parsed_date" in df else parse_dates(published)
+    date_out = parsed.dt.strftime("%d/%m/%Y").fillna(published.fillna("").astype(str).str.strip())
+
+    # Colonnes canoniques : pas de pd.Series construite par ligne comme avec iterrows()
+    # Cellules vides -> "" (et non "nan"), sinon elles passeraient pour du contenu
+    def text(col):
+        return df[col].fillna("").astype(str).str.strip()
+
+    publication = text(col_map["publication"])
+    canon = pd.DataFrame({
+        "publication": publication,
+        "url": text(col_map["URL"]),
+        "date": date_out,
+        "title": text(title_col) if title_col else publication,
+        "content": text(content_col) if content_col else "",
+    })
+
+    return [
+        {"publication": r.publication, "date_str": r.date, "title": r.title, "content": r.content, "url": r.url or None}
+        for r in canon.itertuples(index=False)
+    ]
+
+def build_rows(articles, summaries):
+    rows = []
+    for a, summary in zip(articles, summaries):
+        if not isinstance(summary, str) or not summary:
+            summary = a["title"] or "Résumé indisponible"
+        rows.append({"publication": a["publication"], "date": a["date_str"], "summary": summary, "url": a["url"]})
+    return rows
+
+# --- Rendu HTML ---
+_HEADER_TMPL = "<h1>{title}</h1>"
+_CARD_TMPL = (
+    "\n<div style='margin-bottom:12px;padding:10px;border:1px solid #ccc;border-radius:5px;'>"
+    "\n<b>Publication:</b> {pub}<br>"
+    "\n<b>Date:</b> {date}<br>"
+    "\n<b>Résumé:</b> {summary}<br>"
+    "{link}"
+    "\n</div>"
+)
+_LINK_TMPL = "\n<b>Lien:</b> <a href='{url}'>{url}</a>"
+
 def build_email_html(rows, title="Revue de presse"):
-    parts = [f"<h1>{html.escape(title)}</h1>"]
+    esc = html.escape
+    card = _CARD_TMPL.format_map
+    buf = io.StringIO()
+    buf.write(_HEADER_TMPL.format(title=esc(title)))
     for r in rows:
-        parts.append("<div style='margin-bottom:12px;padding:10px;border:1px solid #ccc;border-radius:5px;'>")
-        parts.append(f"<b>Publication:</b> {html.escape(r['publication'])}<br>")
-        parts.append(f"<b>Date:</b> {html.escape(r['date'])}<br>")
-        parts.append(f"<b>Résumé:</b> {html.escape(r['summary'])}<br>")
-        if r.get("url"):
-            parts.append(f"<b>Lien:</b> <a href='{html.escape(r['url'])}'>{html.escape(r['url'])}</a>")
-        parts.append("</div>")
-    return "\n".join(parts)
+        url = r.get("url")
+        buf.write(card({
+            "pub": esc(r["publication"]),
+            "date": esc(r["date"]),
+            "summary": esc(r["summary"]),
+            "link": _LINK_TMPL.format(url=esc(url)) if url else "",
+        }))
+    return buf.getvalue()
 
 # --- Routes Flask ---
 @app.route("/", methods=["GET", "POST"])
@@ -104,22 +652,11 @@ def index():
             return render_template("index.html", error="Aucun fichier uploadé")
 
         try:
-            df = pd.read_excel(file)
+            df = read_excel(file)
             issues, col_map, content_col, title_col = validate_dataframe(df)
-            rows = []
-
-            for idx, row in df.iterrows():
-                publication = str(row.get(col_map["publication"], "")).strip()
-                url = str(row.get(col_map["URL"], "")).strip() or None
-                dt = row.get("_parsed_date") or coerce_date(row.get(col_map["published"]))
-                date_out = dt.strftime("%d/%m/%Y") if isinstance(dt, datetime) else str(row.get(col_map["published"], "")).strip()
-                title_val = str(row.get(title_col, "")).strip() if title_col else publication
-                content_val = str(row.get(content_col, "")).strip() if content_col else ""
-                try:
-                    summary = smart_summarize(publication, date_out, title_val, content_val, url)
-                except Exception:
-                    summary = title_val or "Résumé indisponible"
-                rows.append({"publication": publication, "date": date_out, "summary": summary, "url": url})
+            articles = extract_articles(df, col_map, content_col, title_col)
+            summaries = run_async(batch_summarize(articles))
+            rows = build_rows(articles, summaries)
 
             html_out = build_email_html(rows, title=report_title)
             return render_template("result.html", html_out=html_out, issues=issues)
@@ -129,5 +666,42 @@ def index():
 
     return render_template("index.html")
 
+# --- Traitement hors ligne (CLI) ---
+def run_offline(paths, report_title, output, use_batch=False):
+    articles = []
+    for path, df in zip(paths, load_excels(paths)):
+        issues, col_map, content_col, title_col = validate_dataframe(df)
+        for issue in issues:
+            print(f"{path} : {issue}", file=sys.stderr)
+        if not col_map:
+            sys.exit(1)
+        articles.extend(extract_articles(df, col_map, content_col, title_col))
+
+    if use_batch:
+        try:
+            summaries = summarize_with_batch_api(articles)
+        except RuntimeError as e:
+            print(f"❌ {e}", file=sys.stderr)
+            sys.exit(1)
+    else:
+        summaries = run_async(batch_summarize(articles))
+    rows = build_rows(articles, summaries)
+
+    with open(output, "w", encoding="utf-8") as f:
+        f.write(build_email_html(rows, title=report_title))
+    print(f"✅ {len(rows)} articles → {output}")
+
 if __name__ == "__main__":
-    app.run(host="0.0.0.0", port=int(os.environ.get("PORT", 5000)), debug=True)
+    cli = argparse.ArgumentParser(description="Revue de presse : serveur Flask, ou génération hors ligne si un fichier Excel est donné.")
+    cli.add_argument("excel", nargs="*", help="Fichier(s) Excel à traiter hors ligne, regroupés en une seule revue (sinon lance le serveur)")
+    cli.add_argument("--batch", action="store_true", help="Utiliser l'API Batch d'OpenAI (moins cher, résultat sous 24h max)")
+    cli.add_argument("--title", default="Revue de presse", help="Titre de la revue")
+    cli.add_argument("--output", default="revue_de_presse.html", help="Fichier HTML de sortie")
+    args = cli.parse_args()
+    if args.batch and not args.excel:
+        cli.error("--batch nécessite un fichier Excel")
+
+    if args.excel:
+        run_offline(args.excel, args.title, args.output, use_batch=args.batch)
+    else:
+        app.run(host="0.0.0.0", port=int(os.environ.get("PORT", 5000)), debug=True)